@@ -1,6 +1,11 @@
 """ Yandex.Lavka integration. """
 
+import time
+
+_IMPORT_STARTED = time.perf_counter()
+
 import asyncio
+import datetime
 import logging
 
 from homeassistant.config_entries import ConfigEntry
@@ -16,8 +21,11 @@ from homeassistant.helpers import (
     aiohttp_client as ac,
     config_validation as cv,
     device_registry as dr,
+    entity_registry as er,
 )
+from homeassistant.helpers.event import async_track_time_change
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
+from homeassistant.util import dt as dt_util
 import voluptuous as vol
 
 from ..yandex_station.core.const import DATA_CONFIG
@@ -33,10 +41,21 @@ from .yandex_lavka import YandexLavka
 
 _LOGGER = logging.getLogger(__name__)
 
-PLATFORMS: list[Platform] = [Platform.SENSOR]
+PLATFORMS: list[Platform] = [Platform.BINARY_SENSOR, Platform.SENSOR]
 
 CONF_DEBUG = "debug"
 
+# Stored in entry data next to the session; not passed to `YandexSession`.
+CONF_COOKIES_REFRESHED_AT = "cookies_refreshed_at"
+
+# entry id -> entry data last written by the integration itself
+DATA_SESSIONS = "sessions"
+
+# Cookies refreshed more recently than this are trusted at setup and re-checked in the background.
+SESSION_MAX_AGE = datetime.timedelta(days=1)
+
+IMPORT_TIME = (time.perf_counter() - _IMPORT_STARTED)
+
 CONFIG_SCHEMA = vol.Schema({
     DOMAIN: vol.Schema({
         vol.Optional(CONF_USERNAME): cv.string,
@@ -51,25 +70,64 @@ type YandexLavkaConfigEntry = ConfigEntry[YandexLavkaCoordinator]
 
 async def async_setup(hass: HomeAssistant, hass_config: dict):
     config: dict = (hass_config.get(DOMAIN) or {})
-    hass.data[DOMAIN] = {DATA_CONFIG: config}
+    hass.data[DOMAIN] = {DATA_CONFIG: config, DATA_SESSIONS: {}}
 
     return True
 
 
+def _log_startup(hass: HomeAssistant, entry: YandexLavkaConfigEntry, msg: str, *args):
+    """ Startup profiling hook; logged at info level with `debug: true` in YAML, at debug level otherwise. """
+
+    debug = hass.data[DOMAIN][DATA_CONFIG].get(CONF_DEBUG)
+    _LOGGER.log((logging.INFO if debug else logging.DEBUG), f"[%s] {msg}", entry.title, *args)
+
+
 async def async_setup_entry(hass: HomeAssistant, entry: YandexLavkaConfigEntry):
+    setup_started = time.perf_counter()
+
+    # Only needed once an entry is set up; keeps `sqlite3` out of the integration import.
+    from .archive import YandexLavkaArchive
+
+    session_data = {k: v for k, v in entry.data.items() if k != CONF_COOKIES_REFRESHED_AT}
+
+    def update_session(**kwargs):
+        session_data.clear()
+        session_data.update(kwargs)
+        data = hass.data[DOMAIN][DATA_SESSIONS][entry.entry_id] = {**kwargs, CONF_COOKIES_REFRESHED_AT: dt_util.utcnow().timestamp()}
+        hass.config_entries.async_update_entry(entry, data=data)
+
     async def update_cookie_and_token(**kwargs):
-        hass.config_entries.async_update_entry(entry, data=kwargs)
+        update_session(**kwargs)
 
     session = ac.async_create_clientsession(hass)
-    yandex = YandexSession(session, **entry.data)
+    yandex = YandexSession(session, **session_data)
     yandex.add_update_listener(update_cookie_and_token)
 
-    try:
-        ok = await yandex.refresh_cookies()
-    except Exception as e:
-        raise ConfigEntryNotReady() from e
-
-    if not ok:
+    async def refresh_cookies() -> bool:
+        try:
+            ok = await yandex.refresh_cookies()
+        except Exception as e:
+            raise ConfigEntryNotReady() from e
+
+        if ok: update_session(**session_data)
+        return ok
+
+    cookies_refreshed_at = entry.data.get(CONF_COOKIES_REFRESHED_AT)
+    if ('cookie' in entry.data and cookies_refreshed_at is not None
+            and dt_util.utcnow().timestamp() - cookies_refreshed_at < SESSION_MAX_AGE.total_seconds()):
+        async def refresh_cookies_background():
+            try:
+                ok = await refresh_cookies()
+            except ConfigEntryNotReady:
+                _LOGGER.warning("Failed to refresh Yandex cookies, keeping the current session", exc_info=True)
+                return
+
+            if not ok:
+                # Setup has already succeeded, so the reauth flow replaces the notification below.
+                entry.async_start_reauth(hass)
+
+        entry.async_create_background_task(hass, refresh_cookies_background(), f"{DOMAIN}_refresh_cookies")
+    elif not await refresh_cookies():
         hass.components.persistent_notification.async_create(
             "Необходимо заново авторизоваться в Яндексе. Для этого [добавьте "
             "новую интеграцию](/config/integrations) с тем же логином.",
@@ -82,19 +140,69 @@ async def async_setup_entry(hass: HomeAssistant, entry: YandexLavkaConfigEntry):
     if not entry.update_listeners:
         entry.add_update_listener(async_update_options)
 
+    archive = YandexLavkaArchive(hass, entry.entry_id)
+    await archive.async_load()
+    # Time-based aggregates (month spend, orders per week) drift without new orders.
+    entry.async_on_unload(async_track_time_change(hass, archive.async_update_listeners, hour=0, minute=0, second=0))
+
+    service_info_coordinator = YandexLavkaServiceInfoCoordinator(hass, lavka)
+    if ((previous := hass.data[DOMAIN].get(entry.unique_id)) is not None):
+        # Keep the in-memory service history across reloads, e.g. after the user enables an archived entity.
+        service_info_coordinator.histories = previous['service_info_coordinator'].histories
+
     data = hass.data[DOMAIN][entry.unique_id] = {
-        'service_info_coordinator': YandexLavkaServiceInfoCoordinator(hass, lavka),
+        'service_info_coordinator': service_info_coordinator,
         'orders_coordinator': YandexLavkaOrdersCoordinator(hass, lavka),
         'parcels_coordinator': YandexLavkaParcelsCoordinator(hass, lavka),
+        'order_history': set(),  # ids of closed orders not materialized as entities
+        'parcel_history': set(),  # ids of finished parcels not materialized as entities
+        'archive': archive,
     }
-    await asyncio.gather(*(i.async_config_entry_first_refresh() for i in data.values() if isinstance(i, DataUpdateCoordinator)))
 
+    # Entities are added before the first refresh and fill in once it lands.
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
 
+    async def first_refresh():
+        await asyncio.gather(*(i.async_refresh() for i in data.values() if isinstance(i, DataUpdateCoordinator)))
+        _log_startup(hass, entry, "time to first entity update: %.3f s", (time.perf_counter() - setup_started))
+
+    entry.async_create_background_task(hass, first_refresh(), f"{DOMAIN}_first_refresh")
+
+    _log_startup(hass, entry, "import time: %.3f s, setup time: %.3f s", IMPORT_TIME, (time.perf_counter() - setup_started))
+
+    return True
+
+
+async def async_migrate_entry(hass: HomeAssistant, entry: YandexLavkaConfigEntry):
+    if (entry.version == 1 and entry.minor_version < 2):
+        # Order and parcel entities are now only materialized while active: disable the ones
+        # registered by earlier versions once; active ones are registered again on the first refresh.
+        registry = er.async_get(hass)
+        prefixes = (f"{entry.entry_id}_order_", f"{entry.entry_id}_parcel_")
+
+        for entity_entry in er.async_entries_for_config_entry(registry, entry.entry_id):
+            if (not entity_entry.unique_id.startswith(prefixes) or entity_entry.disabled_by is not None): continue
+            registry.async_update_entity(
+                entity_entry.entity_id,
+                disabled_by=er.RegistryEntryDisabler.INTEGRATION,
+                hidden_by=(None if (entity_entry.hidden_by is er.RegistryEntryHider.INTEGRATION) else entity_entry.hidden_by),
+            )
+
+        hass.config_entries.async_update_entry(entry, minor_version=2)
+
     return True
 
 
+async def async_remove_entry(hass: HomeAssistant, entry: YandexLavkaConfigEntry):
+    from .archive import YandexLavkaArchive
+
+    await YandexLavkaArchive(hass, entry.entry_id).async_remove()
+
+
 async def async_update_options(hass: HomeAssistant, config_entry: YandexLavkaConfigEntry):
+    # Session updates written by the integration itself are already in use.
+    if (config_entry.data == hass.data[DOMAIN][DATA_SESSIONS].get(config_entry.entry_id)): return
+
     await hass.config_entries.async_reload(config_entry.entry_id)
 
 
@@ -0,0 +1,194 @@
+""" Local archive of closed Yandex.Lavka orders and finished parcels. """
+
+import contextlib
+import datetime
+import json
+import logging
+import os
+import sqlite3
+from typing import Callable
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.storage import STORAGE_DIR
+from homeassistant.util import dt as dt_util
+
+from .const import DOMAIN, KIND_ORDER
+from .yandex_lavka import parse_amount
+
+
+_LOGGER = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS archive (
+    kind TEXT NOT NULL,
+    id TEXT NOT NULL,
+    closed_at INTEGER,  -- NULL for items backfilled without an observed closing transition
+    hour INTEGER,
+    total REAL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (kind, id)
+);
+CREATE INDEX IF NOT EXISTS archive_closed_at ON archive (kind, closed_at);
+"""
+
+
+def _month_start(now: datetime.datetime) -> datetime.datetime:
+    return now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+class YandexLavkaArchive:
+    """ Append-once SQLite archive with running aggregates kept in memory.
+
+    Rows are written once, when an item first leaves the active set. Aggregates are
+    loaded with a few indexed queries on startup and then updated incrementally.
+    Items that were already closed when first seen have no closing time and are
+    left out of the time-based aggregates.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry_id: str):
+        self.hass = hass
+        self.path = hass.config.path(STORAGE_DIR, f"{DOMAIN}.{entry_id}.db")
+        self._listeners: list[CALLBACK_TYPE] = list()
+        self._known: set[tuple[str, str]] = set()
+        self._pending: set[tuple[str, str]] = set()
+        self._failed: list[tuple] = list()  # rows to retry with the next write
+
+        self.orders_count = 0
+        self.orders_priced = 0
+        self.orders_total = 0.0
+        self.orders_timed = 0
+        self.first_order_at: float | None = None
+        self.month_start: datetime.datetime | None = None
+        self.month_total = 0.0
+        self.hours = [0] * 24
+
+    async def async_load(self) -> None:
+        """ Load aggregates from the database. An unreadable archive must not break setup: it is logged and the aggregates start empty. """
+
+        self.month_start = _month_start(dt_util.now())
+
+        try:
+            known, stats, month_total, hours = await self.hass.async_add_executor_job(self._load, self.month_start.timestamp())
+        except sqlite3.Error:
+            _LOGGER.exception("Failed to load the archive from %s, starting with empty aggregates", self.path)
+            return
+
+        self._known = known
+        self.orders_count, self.orders_priced, self.orders_total, self.orders_timed, self.first_order_at = stats
+        self.month_total = month_total
+        for hour, count in hours: self.hours[hour] = count
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path)
+        db.executescript(SCHEMA)
+        return db
+
+    def _load(self, month_start: float):
+        with contextlib.closing(self._connect()) as db:
+            known = set(db.execute("SELECT kind, id FROM archive"))
+            stats = db.execute("SELECT count(*), count(total), coalesce(sum(total), 0), count(closed_at), min(closed_at) FROM archive WHERE kind = ?", (KIND_ORDER,)).fetchone()
+            month_total, = db.execute("SELECT coalesce(sum(total), 0) FROM archive WHERE kind = ? AND closed_at >= ?", (KIND_ORDER, month_start)).fetchone()
+            hours = db.execute("SELECT hour, count(*) FROM archive WHERE kind = ? AND hour IS NOT NULL GROUP BY hour", (KIND_ORDER,)).fetchall()
+
+        return (known, stats, month_total, hours)
+
+    def _insert(self, rows: list[tuple]) -> None:
+        with contextlib.closing(self._connect()) as db, db:
+            db.executemany("INSERT OR IGNORE INTO archive (kind, id, closed_at, hour, total, data) VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def _remove(self) -> None:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.path)
+
+    async def async_remove(self) -> None:
+        await self.hass.async_add_executor_job(self._remove)
+
+    async def async_archive(self, kind: str, items: dict[str, dict], observed: bool) -> None:
+        """ Archive items that have left the active set. Already archived ones are skipped without touching the database.
+
+        Only `observed` closing transitions get a closing time; items that were already closed when first seen are backfilled without one.
+        """
+
+        now = dt_util.now()
+        rows, self._failed = self._failed, list()
+
+        for item_id, item in items.items():
+            if ((kind, item_id) in self._known or (kind, item_id) in self._pending): continue
+            self._pending.add((kind, item_id))
+
+            total = (parse_amount(item.get('totalPrice')) if (kind == KIND_ORDER) else None)
+            closed_at, hour = ((int(now.timestamp()), now.hour) if (observed) else (None, None))
+            rows.append((kind, item_id, closed_at, hour, total, json.dumps(item, ensure_ascii=False, separators=(',', ':'))))
+
+        if (not rows): return
+
+        try:
+            await self.hass.async_add_executor_job(self._insert, rows)
+        except sqlite3.Error:
+            _LOGGER.exception("Failed to write %d item(s) to the archive, will retry with the next write", len(rows))
+            self._failed.extend(rows)
+            return
+
+        for kind, item_id, closed_at, hour, total, data in rows:
+            self._pending.discard((kind, item_id))
+            self._known.add((kind, item_id))
+            if (kind == KIND_ORDER): self._add_order(closed_at, hour, total)
+
+        self.async_update_listeners()
+
+    def _add_order(self, closed_at: int | None, hour: int | None, total: float | None) -> None:
+        self._roll_month()
+
+        self.orders_count += 1
+        if (total is not None):
+            self.orders_priced += 1
+            self.orders_total += total
+
+        if (closed_at is None): return
+
+        self.orders_timed += 1
+        if (self.first_order_at is None or closed_at < self.first_order_at): self.first_order_at = closed_at
+        self.hours[hour] += 1
+        if (total is not None and closed_at >= self.month_start.timestamp()): self.month_total += total
+
+    def _roll_month(self) -> None:
+        month_start = _month_start(dt_util.now())
+        if (month_start != self.month_start):
+            self.month_start = month_start
+            self.month_total = 0.0
+
+    @property
+    def spend_this_month(self) -> float:
+        self._roll_month()
+        return self.month_total
+
+    @property
+    def average_basket(self) -> float | None:
+        if (not self.orders_priced): return None
+        return (self.orders_total / self.orders_priced)
+
+    @property
+    def orders_per_week(self) -> float | None:
+        if (self.first_order_at is None): return None
+        weeks = max(1.0, (dt_util.utcnow().timestamp() - self.first_order_at) / datetime.timedelta(weeks=1).total_seconds())
+        return (self.orders_timed / weeks)
+
+    @property
+    def favourite_delivery_hour(self) -> int | None:
+        if (not self.orders_timed): return None
+        return max(range(24), key=self.hours.__getitem__)
+
+    @callback
+    def async_add_listener(self, update_callback: CALLBACK_TYPE) -> Callable[[], None]:
+        self._listeners.append(update_callback)
+
+        @callback
+        def remove_listener() -> None:
+            self._listeners.remove(update_callback)
+
+        return remove_listener
+
+    @callback
+    def async_update_listeners(self, *args) -> None:
+        for update_callback in tuple(self._listeners):
+            update_callback()
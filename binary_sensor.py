@@ -0,0 +1,36 @@
+from homeassistant.components.binary_sensor import BinarySensorEntity
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+
+from . import YandexLavkaConfigEntry
+from .const import DOMAIN
+from .coordinator import YandexLavkaServiceInfoCoordinator
+from .entity import YandexLavkaServiceInfoEntity
+
+
+async def async_setup_entry(hass: HomeAssistant, entry: YandexLavkaConfigEntry, async_add_entities: AddEntitiesCallback):
+    data = hass.data[DOMAIN][entry.unique_id]
+
+    service_info_coordinator: YandexLavkaServiceInfoCoordinator = data['service_info_coordinator']
+
+    async_add_entities((SurgeEntity(service_info_coordinator),))
+
+
+class SurgeEntity(YandexLavkaServiceInfoEntity, BinarySensorEntity):
+    _attr_translation_key = 'surge'
+    _attr_has_entity_name = True
+
+    def __init__(self, coordinator):
+        super().__init__(coordinator)
+        self._attr_unique_id = f"{self.coordinator.config_entry.entry_id}_{self.translation_key}"
+
+    def _update_state(self) -> None:
+        history = self.coordinator.history
+
+        self._attr_is_on = history.surge
+        self._attr_extra_state_attributes = {
+            'delivery_cost': history.delivery_cost.last,
+            'delivery_cost_median': history.delivery_cost.median,
+            'minimal_cart_price': history.minimal_cart_price.last,
+            'minimal_cart_price_median': history.minimal_cart_price.median,
+        }
@@ -25,6 +25,9 @@ _LOGGER = logging.getLogger(__name__)
 
 # noinspection PyUnusedLocal
 class YandexGoFlowHandler(ConfigFlow, domain=DOMAIN):
+    VERSION = 1
+    MINOR_VERSION = 2
+
     @property
     @lru_cache
     def yandex(self):
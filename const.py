@@ -10,3 +10,10 @@ BASE_URL = "https://lavka.yandex.ru"
 class DepotType(enum.StrEnum):
 	SUPERMARKET = 'supermarket'
 DEPOT_TYPES = frozenset(map(str, DepotType))
+
+# `received` means the parcel is ready for pickup; picked up parcels normally just leave `orders-by-depot`.
+PARCEL_FINAL_STATES = frozenset(('delivered', 'cancelled'))
+
+# Archive row kinds
+KIND_ORDER = 'order'
+KIND_PARCEL = 'parcel'
@@ -5,13 +5,18 @@ import async_timeout
 from homeassistant.core import HomeAssistant
 #from homeassistant.exceptions import ConfigEntryAuthFailed
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+from homeassistant.util import dt as dt_util
 
 from .const import DEFAULT_NAME
+from .service_history import ServiceHistory
 from .yandex_lavka import YandexLavka
 
 
 _LOGGER = logging.getLogger(__name__)
 
+SERVICE_HISTORY_WINDOW = datetime.timedelta(hours=24)
+SERVICE_HISTORY_WARMUP = datetime.timedelta(hours=3)
+
 
 class YandexLavkaServiceInfoCoordinator(DataUpdateCoordinator):
     def __init__(self, hass: HomeAssistant, lavka: YandexLavka):
@@ -23,18 +28,35 @@ class YandexLavkaServiceInfoCoordinator(DataUpdateCoordinator):
             always_update=True,
         )
         self.lavka = lavka
+        self.histories: dict[tuple[float, float], ServiceHistory] = dict()
+
+    @property
+    def location(self) -> tuple[float, float]:
+        return (self.hass.config.longitude, self.hass.config.latitude)
+
+    @property
+    def history(self) -> ServiceHistory:
+        try: return self.histories[self.location]
+        except KeyError: pass
+
+        history = self.histories[self.location] = ServiceHistory(SERVICE_HISTORY_WINDOW // self.update_interval, SERVICE_HISTORY_WARMUP // self.update_interval)
+        return history
 
     async def _async_update_data(self) -> dict:
         try:
             async with async_timeout.timeout(10):
-                service_info = await self.lavka.service_info((self.hass.config.longitude, self.hass.config.latitude))
+                service_info = await self.lavka.service_info(self.location)
         #except ApiAuthError as err:
         #    # Raising ConfigEntryAuthFailed will cancel future updates
         #    # and start a config flow with SOURCE_REAUTH (async_step_reauth)
         #    raise ConfigEntryAuthFailed() from err
         except Exception as ex:
+            # Keep the window at 24 h of wall time across outages.
+            self.history.push_missing()
             raise UpdateFailed() from ex
 
+        self.history.push(service_info, dt_util.utcnow().timestamp())
+
         return service_info
 
 
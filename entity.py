@@ -0,0 +1,50 @@
+import abc
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import callback
+from homeassistant.helpers.device_registry import DeviceEntryType, DeviceInfo
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
+
+from .const import BASE_URL, DEFAULT_NAME, DOMAIN
+from .coordinator import (
+    YandexLavkaOrdersCoordinator,
+    YandexLavkaParcelsCoordinator,
+    YandexLavkaServiceInfoCoordinator,
+)
+
+
+def device_info(config_entry: ConfigEntry) -> DeviceInfo:
+    return DeviceInfo(
+        identifiers={(DOMAIN, config_entry.entry_id)},
+        name=f"{DEFAULT_NAME} {config_entry.title}",
+        entry_type=DeviceEntryType.SERVICE,
+        configuration_url=BASE_URL,
+    )
+
+
+class YandexLavkaCoordinatorEntity(CoordinatorEntity):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._attr_device_info = device_info(self.coordinator.config_entry)
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        # Listeners are also called when the first refresh fails, with no data yet; `available` covers that.
+        if (self.coordinator.data is not None): self._update_state()
+        self.async_write_ha_state()
+
+    @abc.abstractmethod
+    def _update_state(self) -> None:
+        ...
+
+
+class YandexLavkaServiceInfoEntity(YandexLavkaCoordinatorEntity, CoordinatorEntity[YandexLavkaServiceInfoCoordinator]):
+    pass
+
+
+class YandexLavkaOrdersEntity(YandexLavkaCoordinatorEntity, CoordinatorEntity[YandexLavkaOrdersCoordinator]):
+    pass
+
+
+class YandexLavkaParcelsEntity(YandexLavkaCoordinatorEntity, CoordinatorEntity[YandexLavkaParcelsCoordinator]):
+    pass
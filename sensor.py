@@ -1,19 +1,30 @@
+import abc
 import itertools
+from typing import TYPE_CHECKING
 
-from homeassistant.const import MATCH_ALL, EntityCategory
+from homeassistant.const import MATCH_ALL, EntityCategory, Platform
 from homeassistant.core import HomeAssistant, callback
-from homeassistant.helpers.device_registry import DeviceEntryType, DeviceInfo
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.entity import Entity
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
-from homeassistant.helpers.update_coordinator import CoordinatorEntity
-from homeassistant.util import slugify
+from homeassistant.util import dt as dt_util, slugify
 
 from . import YandexLavkaConfigEntry
-from .const import BASE_URL, DEFAULT_NAME, DOMAIN
+from .const import DOMAIN, KIND_ORDER, KIND_PARCEL, PARCEL_FINAL_STATES
 from .coordinator import (
     YandexLavkaOrdersCoordinator,
     YandexLavkaParcelsCoordinator,
     YandexLavkaServiceInfoCoordinator,
 )
+from .entity import (
+    YandexLavkaOrdersEntity,
+    YandexLavkaParcelsEntity,
+    YandexLavkaServiceInfoEntity,
+    device_info,
+)
+
+if TYPE_CHECKING:
+    from .archive import YandexLavkaArchive
 
 
 async def async_setup_entry(hass: HomeAssistant, entry: YandexLavkaConfigEntry, async_add_entities: AddEntitiesCallback):
@@ -22,35 +33,82 @@ async def async_setup_entry(hass: HomeAssistant, entry: YandexLavkaConfigEntry,
     service_info_coordinator: YandexLavkaServiceInfoCoordinator = data['service_info_coordinator']
     orders_coordinator: YandexLavkaOrdersCoordinator = data['orders_coordinator']
     parcels_coordinator: YandexLavkaParcelsCoordinator = data['parcels_coordinator']
+    archive: 'YandexLavkaArchive' = data['archive']
 
     async_add_entities(itertools.chain(
         map(lambda cls: cls(service_info_coordinator), (DeliveryCostEntity, DeliveryTimeEntity, MinimalCartPriceEntity, CashbackEntity)),
+        map(lambda cls: cls(service_info_coordinator), (DeliveryCostMinEntity, DeliveryCostMedianEntity, DeliveryTimeMedianEntity, LastCheapDeliveryEntity)),
         map(lambda cls: cls(orders_coordinator), (OrdersEntity, ActiveOrdersEntity)),
         map(lambda cls: cls(parcels_coordinator), (ParcelsEntity,)),
-    ), update_before_add=True)
+        map(lambda cls: cls(archive, service_info_coordinator), (SpendThisMonthEntity, AverageBasketEntity, OrdersPerWeekEntity, FavouriteDeliveryHourEntity)),
+    ))  # no `update_before_add`: platform setup must not wait for the first refresh
+
+    registry = er.async_get(hass)
+
+    def check_entities(cls, coordinator, seen: dict, history: set, kind: str):
+        """ Materialize entities for active items only; inactive ones are kept in `history` until the user enables them or they become active again. """
+
+        if (coordinator.data is None): return
+
+        new = list()
+        closed, backfill = dict(), dict()
+
+        for item_id, last in tuple(seen.items()):
+            item = coordinator.data.get(item_id)
+
+            if (item is not None and cls.is_active(item)):
+                seen[item_id] = item
+                continue
 
-    def check_entities(cls, coordinator, seen: set = None):
-        if (seen is None): seen = set()
-        entities = (set(coordinator.data) - seen)
-        async_add_entities((cls(coordinator, i) for i in entities), update_before_add=True)
-        seen |= entities
-        return seen
+            if (last is None and item is not None):
+                # Enabled by the user while inactive (and archived back then): kept until it leaves the API.
+                continue
 
-    seen_orders = check_entities(OrderEntity, orders_coordinator)
-    seen_parcels = check_entities(ParcelEntity, parcels_coordinator)
-    entry.async_on_unload(orders_coordinator.async_add_listener(lambda: check_entities(OrderEntity, orders_coordinator, seen_orders)))
-    entry.async_on_unload(orders_coordinator.async_add_listener(lambda: check_entities(ParcelEntity, parcels_coordinator, seen_parcels)))
+            # Closing transition, or the item has left the API: the entity is removed by the registry.
+            entity_id = registry.async_get_entity_id(Platform.SENSOR, DOMAIN, cls.make_unique_id(coordinator, item_id))
+            if (entity_id is not None and registry.async_get(entity_id).disabled_by is None):
+                registry.async_update_entity(entity_id, disabled_by=er.RegistryEntryDisabler.INTEGRATION)
+            del seen[item_id]
+            history.add(item_id)
+            if (last is not None): closed[item_id] = (item or last)
 
+        for item_id, item in coordinator.data.items():
+            if (item_id in seen or item_id in closed): continue
 
-class YandexLavkaServiceInfoEntity(CoordinatorEntity[YandexLavkaServiceInfoCoordinator]):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self._attr_device_info = DeviceInfo(
-            identifiers={(DOMAIN, self.coordinator.config_entry.entry_id)},
-            name=f"{DEFAULT_NAME} {self.coordinator.config_entry.title}",
-            entry_type=DeviceEntryType.SERVICE,
-            configuration_url=BASE_URL,
-        )
+            active = cls.is_active(item)
+
+            if (item_id in history and not active):
+                continue
+
+            entity_id = registry.async_get_entity_id(Platform.SENSOR, DOMAIN, cls.make_unique_id(coordinator, item_id))
+            entity_entry = (registry.async_get(entity_id) if (entity_id is not None) else None)
+
+            if (active):
+                if (entity_entry is not None and entity_entry.disabled_by is er.RegistryEntryDisabler.INTEGRATION):
+                    # Re-enabling the entry would make HA reload the whole config entry; register it afresh instead.
+                    registry.async_remove(entity_id)
+            elif (entity_entry is None or entity_entry.disabled):
+                history.add(item_id)
+                backfill[item_id] = item
+                continue
+            else:
+                # Enabled by the user from the UI. Note that enabling a disabled entity makes HA reload the config entry.
+                backfill[item_id] = item
+
+            history.discard(item_id)
+            seen[item_id] = (item if (active) else None)
+            new.append(cls(coordinator, item_id))
+
+        if (new): async_add_entities(new, update_before_add=True)
+        if (closed): entry.async_create_background_task(hass, archive.async_archive(kind, closed, observed=True), f"{DOMAIN}_archive_{kind}")
+        if (backfill): entry.async_create_background_task(hass, archive.async_archive(kind, backfill, observed=False), f"{DOMAIN}_archive_{kind}_backfill")
+
+    # item id -> last payload of an active item, to archive it once it closes or leaves the API; None for items enabled by the user while inactive
+    seen_orders, seen_parcels = dict(), dict()
+    check_entities(OrderEntity, orders_coordinator, seen_orders, data['order_history'], KIND_ORDER)
+    check_entities(ParcelEntity, parcels_coordinator, seen_parcels, data['parcel_history'], KIND_PARCEL)
+    entry.async_on_unload(orders_coordinator.async_add_listener(lambda: check_entities(OrderEntity, orders_coordinator, seen_orders, data['order_history'], KIND_ORDER)))
+    entry.async_on_unload(parcels_coordinator.async_add_listener(lambda: check_entities(ParcelEntity, parcels_coordinator, seen_parcels, data['parcel_history'], KIND_PARCEL)))
 
 
 class DeliveryCostEntity(YandexLavkaServiceInfoEntity):
@@ -61,17 +119,14 @@ class DeliveryCostEntity(YandexLavkaServiceInfoEntity):
     def __init__(self, coordinator):
         super().__init__(coordinator)
         self._attr_unique_id = f"{self.coordinator.config_entry.entry_id}_{self.translation_key}"
-        self._attr_unit_of_measurement = self._currency
 
-    @callback
-    def _handle_coordinator_update(self) -> None:
+    def _update_state(self) -> None:
         pricing = self._pricing
 
         self._attr_state = pricing['deliveryCost']
+        self._attr_unit_of_measurement = self._currency
         self._attr_extra_state_attributes = self.coordinator.data
 
-        self.async_write_ha_state()
-
     @property
     def _currency(self) -> str:
         return self.coordinator.data['currencySign']
@@ -90,13 +145,10 @@ class DeliveryTimeEntity(YandexLavkaServiceInfoEntity):
         super().__init__(coordinator)
         self._attr_unique_id = f"{self.coordinator.config_entry.entry_id}_{self.translation_key}"
 
-    @callback
-    def _handle_coordinator_update(self) -> None:
+    def _update_state(self) -> None:
         self._attr_state = self._text
         self._attr_extra_state_attributes = self.coordinator.data
 
-        self.async_write_ha_state()
-
     @property
     def _text(self) -> str:
         return self.coordinator.data['deliveryTimeText']
@@ -110,17 +162,14 @@ class MinimalCartPriceEntity(YandexLavkaServiceInfoEntity):
     def __init__(self, coordinator):
         super().__init__(coordinator)
         self._attr_unique_id = f"{self.coordinator.config_entry.entry_id}_{self.translation_key}"
-        self._attr_unit_of_measurement = self._currency
 
-    @callback
-    def _handle_coordinator_update(self) -> None:
+    def _update_state(self) -> None:
         pricing = self._pricing
 
         self._attr_state = pricing['minimalCartPrice']
+        self._attr_unit_of_measurement = self._currency
         self._attr_extra_state_attributes = self.coordinator.data
 
-        self.async_write_ha_state()
-
     @property
     def _currency(self) -> str:
         return self.coordinator.data['currencySign']
@@ -138,13 +187,10 @@ class CashbackEntity(YandexLavkaServiceInfoEntity):
         super().__init__(coordinator)
         self._attr_unique_id = f"{self.coordinator.config_entry.entry_id}_{self.translation_key}"
 
-    @callback
-    def _handle_coordinator_update(self) -> None:
+    def _update_state(self) -> None:
         self._attr_state = self._cashbackAmount
         self._attr_extra_state_attributes = self._cashback
 
-        self.async_write_ha_state()
-
     @property
     def _cashback(self) -> dict:
         return self.coordinator.data['cashback']
@@ -154,15 +200,66 @@ class CashbackEntity(YandexLavkaServiceInfoEntity):
         return self.coordinator.data['cashbackAmount']
 
 
-class YandexLavkaOrdersEntity(CoordinatorEntity[YandexLavkaOrdersCoordinator]):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self._attr_device_info = DeviceInfo(
-            identifiers={(DOMAIN, self.coordinator.config_entry.entry_id)},
-            name=f"{DEFAULT_NAME} {self.coordinator.config_entry.title}",
-            entry_type=DeviceEntryType.SERVICE,
-            configuration_url=BASE_URL,
-        )
+class DeliveryCostMinEntity(YandexLavkaServiceInfoEntity):
+    _attr_translation_key = 'delivery_cost_min'
+    _attr_has_entity_name = True
+
+    def __init__(self, coordinator):
+        super().__init__(coordinator)
+        self._attr_unique_id = f"{self.coordinator.config_entry.entry_id}_{self.translation_key}"
+
+    def _update_state(self) -> None:
+        self._attr_state = self.coordinator.history.delivery_cost.min
+        self._attr_unit_of_measurement = self.coordinator.data['currencySign']
+
+
+class DeliveryCostMedianEntity(YandexLavkaServiceInfoEntity):
+    _attr_translation_key = 'delivery_cost_median'
+    _attr_has_entity_name = True
+
+    def __init__(self, coordinator):
+        super().__init__(coordinator)
+        self._attr_unique_id = f"{self.coordinator.config_entry.entry_id}_{self.translation_key}"
+
+    def _update_state(self) -> None:
+        history = self.coordinator.history
+
+        self._attr_state = history.delivery_cost.median
+        self._attr_unit_of_measurement = self.coordinator.data['currencySign']
+        self._attr_extra_state_attributes = {
+            'minimal_cart_price_median': history.minimal_cart_price.median,
+            'samples': history.delivery_cost.size,
+        }
+
+
+class DeliveryTimeMedianEntity(YandexLavkaServiceInfoEntity):
+    _attr_translation_key = 'delivery_time_median'
+    _attr_has_entity_name = True
+    _attr_unit_of_measurement = 'min'
+
+    def __init__(self, coordinator):
+        super().__init__(coordinator)
+        self._attr_unique_id = f"{self.coordinator.config_entry.entry_id}_{self.translation_key}"
+
+    def _update_state(self) -> None:
+        self._attr_state = self.coordinator.history.delivery_time.median
+
+
+class LastCheapDeliveryEntity(YandexLavkaServiceInfoEntity):
+    """ When delivery cost was last below its rolling median; shown as "time since" by the frontend. """
+
+    _attr_translation_key = 'last_cheap_delivery'
+    _attr_has_entity_name = True
+    _attr_device_class = 'timestamp'
+
+    def __init__(self, coordinator):
+        super().__init__(coordinator)
+        self._attr_unique_id = f"{self.coordinator.config_entry.entry_id}_{self.translation_key}"
+
+    def _update_state(self) -> None:
+        last_cheap_at = self.coordinator.history.last_cheap_at
+
+        self._attr_state = (dt_util.utc_from_timestamp(last_cheap_at).isoformat() if (last_cheap_at is not None) else None)
 
 
 class OrdersEntity(YandexLavkaOrdersEntity):
@@ -174,8 +271,7 @@ class OrdersEntity(YandexLavkaOrdersEntity):
         super().__init__(coordinator)
         self._attr_unique_id = f"{self.coordinator.config_entry.entry_id}_{self.translation_key}"
 
-    @callback
-    def _handle_coordinator_update(self) -> None:
+    def _update_state(self) -> None:
         orders = self._orders
 
         self._attr_state = len(orders)
@@ -183,8 +279,6 @@ class OrdersEntity(YandexLavkaOrdersEntity):
             'orders': tuple(orders.keys()),
         }
 
-        self.async_write_ha_state()
-
     @property
     def _orders(self) -> dict:
         return self.coordinator.data
@@ -207,14 +301,22 @@ class OrderEntity(YandexLavkaOrdersEntity):
         super().__init__(coordinator)
         self._order_id = order_id
         order = self._order
-        self._attr_unique_id = f"{self.coordinator.config_entry.entry_id}_{self.translation_key}_{slugify(order_id)}"
-        self._attr_entity_registry_visible_default = (order.get('status') != 'closed')
+        self._attr_unique_id = self.make_unique_id(coordinator, order_id)
         self._attr_translation_placeholders = {
             'order_no': order.get('shortOrderId', order_id),
         }
 
-    @callback
-    def _handle_coordinator_update(self) -> None:
+    @classmethod
+    def make_unique_id(cls, coordinator, order_id) -> str:
+        return f"{coordinator.config_entry.entry_id}_{cls._attr_translation_key}_{slugify(order_id)}"
+
+    @staticmethod
+    def is_active(order: dict) -> bool:
+        return (order.get('status') != 'closed')
+
+    def _update_state(self) -> None:
+        if (self._order_id not in self.coordinator.data): return  # left the API, being archived
+
         order = self._order
 
         self._attr_state = order['status']
@@ -224,24 +326,11 @@ class OrderEntity(YandexLavkaOrdersEntity):
         }
         self._attr_extra_state_attributes = order
 
-        self.async_write_ha_state()
-
     @property
     def _order(self) -> dict:
         return self.coordinator.data[self._order_id]
 
 
-class YandexLavkaParcelsEntity(CoordinatorEntity[YandexLavkaParcelsCoordinator]):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self._attr_device_info = DeviceInfo(
-            identifiers={(DOMAIN, self.coordinator.config_entry.entry_id)},
-            name=f"{DEFAULT_NAME} {self.coordinator.config_entry.title}",
-            entry_type=DeviceEntryType.SERVICE,
-            configuration_url=BASE_URL,
-        )
-
-
 class ParcelsEntity(YandexLavkaParcelsEntity):
     _attr_translation_key = 'parcels'
     _attr_has_entity_name = True
@@ -251,8 +340,7 @@ class ParcelsEntity(YandexLavkaParcelsEntity):
         super().__init__(coordinator)
         self._attr_unique_id = f"{self.coordinator.config_entry.entry_id}_{self.translation_key}"
 
-    @callback
-    def _handle_coordinator_update(self) -> None:
+    def _update_state(self) -> None:
         parcels = self._parcels
 
         self._attr_state = len(parcels)
@@ -260,8 +348,6 @@ class ParcelsEntity(YandexLavkaParcelsEntity):
             'parcels': tuple(parcels.keys()),
         }
 
-        self.async_write_ha_state()
-
     @property
     def _parcels(self) -> dict:
         return self.coordinator.data
@@ -276,14 +362,22 @@ class ParcelEntity(YandexLavkaParcelsEntity):
         super().__init__(coordinator)
         self._parcel_id = parcel_id
         parcel = self._parcel
-        self._attr_unique_id = f"{self.coordinator.config_entry.entry_id}_{self.translation_key}_{slugify(parcel_id)}"
-        self._attr_entity_registry_visible_default = (parcel.get('state', 'received') == 'received')
+        self._attr_unique_id = self.make_unique_id(coordinator, parcel_id)
         self._attr_translation_placeholders = {
             'parcel_no': parcel.get('refOrder', parcel_id),
         }
 
-    @callback
-    def _handle_coordinator_update(self) -> None:
+    @classmethod
+    def make_unique_id(cls, coordinator, parcel_id) -> str:
+        return f"{coordinator.config_entry.entry_id}_{cls._attr_translation_key}_{slugify(parcel_id)}"
+
+    @staticmethod
+    def is_active(parcel: dict) -> bool:
+        return (parcel.get('state') not in PARCEL_FINAL_STATES)
+
+    def _update_state(self) -> None:
+        if (self._parcel_id not in self.coordinator.data): return  # left the API, being archived
+
         parcel = self._parcel
 
         self._attr_state = parcel['state']
@@ -293,8 +387,85 @@ class ParcelEntity(YandexLavkaParcelsEntity):
         }
         self._attr_extra_state_attributes = parcel
 
-        self.async_write_ha_state()
-
     @property
     def _parcel(self) -> dict:
         return self.coordinator.data[self._parcel_id]
+
+
+class YandexLavkaArchiveEntity(Entity):
+    _attr_has_entity_name = True
+    _attr_should_poll = False
+
+    def __init__(self, archive: 'YandexLavkaArchive', service_info_coordinator: YandexLavkaServiceInfoCoordinator):
+        self.archive = archive
+        self._service_info_coordinator = service_info_coordinator
+        self._attr_unique_id = f"{service_info_coordinator.config_entry.entry_id}_{self.translation_key}"
+        self._attr_device_info = device_info(service_info_coordinator.config_entry)
+
+    async def async_added_to_hass(self) -> None:
+        await super().async_added_to_hass()
+        self._update_state()
+        self.async_on_remove(self.archive.async_add_listener(self._handle_archive_update))
+
+    @callback
+    def _handle_archive_update(self) -> None:
+        self._update_state()
+        self.async_write_ha_state()
+
+    @abc.abstractmethod
+    def _update_state(self) -> None:
+        ...
+
+
+class YandexLavkaArchiveCurrencyEntity(YandexLavkaArchiveEntity):
+    """ Archive entity measured in the service currency, which is only known once service info arrives. """
+
+    _attr_unit_of_measurement = None
+
+    async def async_added_to_hass(self) -> None:
+        await super().async_added_to_hass()
+        self.async_on_remove(self._service_info_coordinator.async_add_listener(self._handle_service_info_update))
+
+    @callback
+    def _handle_service_info_update(self) -> None:
+        if (self._currency != self._attr_unit_of_measurement): self._handle_archive_update()
+
+    @property
+    def _currency(self) -> str | None:
+        if (self._service_info_coordinator.data is None): return None
+        return self._service_info_coordinator.data['currencySign']
+
+
+class SpendThisMonthEntity(YandexLavkaArchiveCurrencyEntity):
+    _attr_translation_key = 'spend_month'
+
+    def _update_state(self) -> None:
+        self._attr_state = round(self.archive.spend_this_month, 2)
+        self._attr_unit_of_measurement = self._currency
+
+
+class AverageBasketEntity(YandexLavkaArchiveCurrencyEntity):
+    _attr_translation_key = 'average_basket'
+
+    def _update_state(self) -> None:
+        average = self.archive.average_basket
+        self._attr_state = (round(average, 2) if (average is not None) else None)
+        self._attr_unit_of_measurement = self._currency
+
+
+class OrdersPerWeekEntity(YandexLavkaArchiveEntity):
+    _attr_translation_key = 'orders_per_week'
+
+    def _update_state(self) -> None:
+        rate = self.archive.orders_per_week
+        self._attr_state = (round(rate, 2) if (rate is not None) else None)
+
+
+class FavouriteDeliveryHourEntity(YandexLavkaArchiveEntity):
+    _attr_translation_key = 'favourite_delivery_hour'
+
+    def _update_state(self) -> None:
+        self._attr_state = self.archive.favourite_delivery_hour
+        self._attr_extra_state_attributes = {
+            'hours': dict(enumerate(self.archive.hours)),
+        }
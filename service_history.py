@@ -0,0 +1,129 @@
+""" In-memory history of Yandex.Lavka service conditions. """
+
+import array
+import bisect
+import math
+import re
+
+from .yandex_lavka import parse_amount
+
+
+DELIVERY_TIME_RE = re.compile(r"(\d+(?:[.,]\d+)?)(?:\s*[–—-]\s*(\d+(?:[.,]\d+)?))?\s*(ч|мин)")
+DELIVERY_TIME_UNITS = {'ч': 60, 'мин': 1}
+
+
+def parse_delivery_time(text) -> float | None:
+    """ Upper bound in minutes from text like "15–25 мин", "1 ч 20 мин" or "1,5–2 ч"; None if there is no number with a unit. """
+
+    if (not isinstance(text, str)): return None
+
+    matches = DELIVERY_TIME_RE.findall(text)
+    if (not matches): return None
+
+    return sum(float((hi or lo).replace(',', '.')) * DELIVERY_TIME_UNITS[unit] for lo, hi, unit in matches)
+
+
+class RollingSeries:
+    """ Fixed-size ring buffer of samples with rolling min/median.
+
+    Samples are kept in a preallocated array; their distribution is kept as counts
+    per distinct value. Pushing and the median are O(distinct values in the window),
+    the minimum is O(1); neither depends on the window length, and service conditions
+    only take a handful of distinct values.
+    """
+
+    def __init__(self, capacity: int):
+        self._values = (array.array('d', (math.nan,)) * capacity)
+        self._pos = 0
+        self._counts: dict[float, int] = dict()
+        self._distinct: list[float] = list()  # sorted keys of `_counts`
+        self.size = 0  # number of non-missing samples in the window
+        self.last: float | None = None
+
+    def push(self, value: float | None) -> None:
+        old = self._values[self._pos]
+        if (not math.isnan(old)): self._remove(old)
+
+        self._values[self._pos] = (value if (value is not None) else math.nan)
+        self._pos = ((self._pos + 1) % len(self._values))
+        self.last = value
+
+        if (value is not None): self._add(value)
+
+    def _add(self, value: float) -> None:
+        count = self._counts.get(value, 0)
+        if (not count): bisect.insort(self._distinct, value)
+        self._counts[value] = (count + 1)
+        self.size += 1
+
+    def _remove(self, value: float) -> None:
+        count = (self._counts.pop(value) - 1)
+        if (count): self._counts[value] = count
+        else: del self._distinct[bisect.bisect_left(self._distinct, value)]
+        self.size -= 1
+
+    @property
+    def min(self) -> float | None:
+        if (not self._distinct): return None
+        return self._distinct[0]
+
+    @property
+    def median(self) -> float | None:
+        if (not self.size): return None
+
+        lo_idx, hi_idx = ((self.size - 1) // 2), (self.size // 2)
+        lo = hi = None
+        seen = 0
+        for value in self._distinct:
+            seen += self._counts[value]
+            if (lo is None and seen > lo_idx): lo = value
+            if (seen > hi_idx):
+                hi = value
+                break
+
+        return ((lo + hi) / 2)
+
+
+class ServiceHistory:
+    """ Rolling window of service conditions for a single location.
+
+    Surge and cheap-window detection only start once the window holds `min_samples`
+    delivery costs; until then every sample would trivially be the min and median.
+    """
+
+    def __init__(self, capacity: int, min_samples: int):
+        self.min_samples = min_samples
+        self.delivery_cost = RollingSeries(capacity)
+        self.minimal_cart_price = RollingSeries(capacity)
+        self.delivery_time = RollingSeries(capacity)
+        self.last_cheap_at: float | None = None
+
+    def push(self, service_info: dict, timestamp: float) -> None:
+        pricing = service_info.get('pricingConditions', {})
+
+        self.delivery_cost.push(parse_amount(pricing.get('deliveryCost')))
+        self.minimal_cart_price.push(parse_amount(pricing.get('minimalCartPrice')))
+        self.delivery_time.push(parse_delivery_time(service_info.get('deliveryTimeText')))
+
+        if (self.ready and self.delivery_cost.last is not None and self.delivery_cost.last < self.delivery_cost.median):
+            self.last_cheap_at = timestamp
+
+    def push_missing(self) -> None:
+        """ Record a failed update, so that the window keeps covering wall time. """
+
+        self.delivery_cost.push(None)
+        self.minimal_cart_price.push(None)
+        self.delivery_time.push(None)
+
+    @property
+    def ready(self) -> bool:
+        return (self.delivery_cost.size >= self.min_samples)
+
+    @property
+    def surge(self) -> bool | None:
+        """ Whether delivery cost or minimal cart price is currently above its rolling median. """
+
+        if (not self.ready or self.delivery_cost.last is None): return None
+
+        return any(series.last is not None and series.last > series.median
+                   for series in (self.delivery_cost, self.minimal_cart_price))
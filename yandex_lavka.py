@@ -1,5 +1,6 @@
 import asyncio
 import logging
+import re
 
 from ..yandex_station.core.yandex_session import YandexSession
 from .const import BASE_URL, DepotType
@@ -10,6 +11,16 @@ _LOGGER = logging.getLogger(__name__)
 API_BASE_URL = f"{BASE_URL}/api/v1"
 
 
+def parse_amount(value) -> float | None:
+    """ Parse an API amount that may come as a number or as text like "49 ₽". """
+
+    if (isinstance(value, (int, float))): return float(value)
+    if (not isinstance(value, str)): return None
+    value = re.sub(r"[^\d.,]", '', value).replace(',', '.')
+    try: return float(value)
+    except ValueError: return None
+
+
 class YandexLavka:
     session: YandexSession
 